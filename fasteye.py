@@ -8,114 +8,219 @@ Date - 18/9/25
 
 import streamlit as st
 import requests
+import orjson
+from requests.adapters import HTTPAdapter
 import re
+import io
+import hashlib
+import bisect
+from functools import partial
+from itertools import chain, groupby, islice
+from operator import itemgetter
 from datetime import datetime, timedelta
 
+_BRACKETED_RE = re.compile(r'\[(\w{3})\s+(\w{3})\s+(\d{1,2})\s+(\d{2}):(\d{2}):(\d{2})\s+(\d{4})\]')
+_TRADITIONAL_RE = re.compile(r'([A-Za-z]{3})\s+(\d{1,2})\s+(\d{2}):(\d{2}):(\d{2})')
+_YEAR_RE = re.compile(r'(\d{4})[-/]')
+_NUMBER_RE = re.compile(r'\b\d+\b')
+_WHITESPACE_RE = re.compile(r'\s+')
+_MONTHS = {'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6,
+           'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12}
+_FORMAT_SCAN_LINES = 200
+
+@st.cache_resource
+def get_session():
+    # Streamlit re-executes this script on every rerun; cache_resource keeps
+    # one keep-alive session so Ollama calls reuse pooled connections.
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_connections=2, pool_maxsize=4))
+    session.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=4))
+    return session
+
 def parse_bracketed_syslog_datetime(line):
-    pattern = r'\[(\w{3})\s+(\w{3})\s+(\d{1,2})\s+(\d{2}):(\d{2}):(\d{2})\s+(\d{4})\]'
-    match = re.match(pattern, line)
+    if not line.startswith('['):
+        return None
+    # Fast path: "[Tue Sep  9 13:12:42 2025]" splits into fixed fields.
+    try:
+        _, month_str, day, hms, year = line[1:line.index(']')].split()
+        # int() also accepts signs, underscores and non-ASCII digits, so
+        # check the fields are plain digits like the regex would require.
+        digits = day + hms[:2] + hms[3:5] + hms[6:8] + year
+        if (len(day) <= 2 and len(hms) == 8 and hms[2] == ':' and hms[5] == ':'
+                and len(year) == 4 and digits.isascii() and digits.isdigit()):
+            return datetime(int(year), _MONTHS[month_str], int(day),
+                            int(hms[:2]), int(hms[3:5]), int(hms[6:8]))
+    except (ValueError, KeyError):
+        pass
+    match = _BRACKETED_RE.match(line)
     if not match:
         return None
     _, month_str, day, hour, minute, second, year = match.groups()
+    month = _MONTHS.get(month_str)
+    if month is None:
+        return None
     try:
-        month = datetime.strptime(month_str, '%b').month
         return datetime(int(year), month, int(day), int(hour), int(minute), int(second))
     except Exception:
         return None
 
 def parse_traditional_syslog_datetime(line, year):
-    pattern = r'([A-Za-z]{3})\s+(\d{1,2})\s+(\d{2}):(\d{2}):(\d{2})'
-    match = re.match(pattern, line)
+    # Reject blank and continuation lines before running the regex.
+    if line[:3] not in _MONTHS:
+        return None
+    match = _TRADITIONAL_RE.match(line)
     if not match:
         return None
     month_str, day, hour, minute, second = match.groups()
+    month = _MONTHS.get(month_str)
+    if month is None:
+        return None
     try:
-        month = datetime.strptime(month_str, '%b').month
         return datetime(year, month, int(day), int(hour), int(minute), int(second))
     except Exception:
         return None
 
-def detect_timestamp_format(log_content):
-    for line in log_content.splitlines():
+def iter_log_lines(uploaded_file):
+    uploaded_file.seek(0)
+    text = io.TextIOWrapper(uploaded_file, encoding="utf-8", errors="ignore")
+    try:
+        for line in text:
+            yield line.rstrip('\n')
+    finally:
+        # Detach so closing the wrapper does not close the uploaded file.
+        text.detach()
+
+def detect_timestamp_format(log_lines):
+    # The format is decided from the head of the file; scanning a whole
+    # traditional log for a bracketed line is wasted work.
+    non_empty = (line for line in log_lines if line.strip())
+    for line in islice(non_empty, _FORMAT_SCAN_LINES):
         if parse_bracketed_syslog_datetime(line):
             return "bracketed"
     return "traditional"
 
-def detect_year_and_times(log_content, timestamp_format):
+def detect_log_year(log_lines, timestamp_format):
+    if timestamp_format == "traditional":
+        for line in log_lines:
+            year_match = _YEAR_RE.search(line)
+            if year_match:
+                return int(year_match.group(1))
+    return datetime.now().year
+
+def parse_log_lines(log_lines, timestamp_format, year):
     if timestamp_format == "bracketed":
-        times = [parse_bracketed_syslog_datetime(line) for line in log_content.splitlines()]
-        times = [dt for dt in times if dt is not None]
-        unique_times = sorted(set(times))
-        year = unique_times[0].year if unique_times else datetime.now().year
-        return year, unique_times
+        parse = parse_bracketed_syslog_datetime
     else:
-        year_match = re.search(r'(\d{4})[-/]', log_content)
-        year = int(year_match.group(1)) if year_match else datetime.now().year
-        times = [parse_traditional_syslog_datetime(line, year) for line in log_content.splitlines()]
-        times = [dt for dt in times if dt is not None]
-        unique_times = sorted(set(times))
-        return year, unique_times
-
-def filter_syslog_by_time(log_content, start, duration_minutes, year, timestamp_format):
+        parse = partial(parse_traditional_syslog_datetime, year=year)
+    parsed_lines = []
+    for line in log_lines:
+        dt = parse(line)
+        if dt:
+            parsed_lines.append((dt, line))
+    # Sorted by time so the window filter can bisect; the sort is stable,
+    # so lines sharing a timestamp keep their original order.
+    parsed_lines.sort(key=itemgetter(0))
+    return parsed_lines
+
+def detect_year_and_times(parsed_lines, timestamp_format, year):
+    # parsed_lines is already time-sorted, so dropping adjacent repeats
+    # yields the sorted unique minutes in one pass. Minute granularity keeps
+    # the event-time dropdown small enough to render quickly.
+    unique_times = [minute for minute, _ in groupby(parsed_lines, key=lambda p: p[0].replace(second=0))]
+    if timestamp_format == "bracketed" and unique_times:
+        year = unique_times[0].year
+    return year, unique_times
+
+def filter_syslog_by_time(parsed_lines, start, duration_minutes):
     end = start + timedelta(minutes=duration_minutes)
-    filtered = []
-    for line in log_content.splitlines():
-        if timestamp_format == "bracketed":
-            dt = parse_bracketed_syslog_datetime(line)
+    lo = bisect.bisect_left(parsed_lines, start, key=itemgetter(0))
+    hi = bisect.bisect_left(parsed_lines, end, lo=lo, key=itemgetter(0))
+    return [line for _, line in parsed_lines[lo:hi]]
+
+def collapse_repeated_lines(log_lines):
+    # Lines that differ only in numbers (timestamps, PIDs, counters) share a
+    # template; send the first of each with a repeat count to save tokens.
+    # Whitespace runs (syslog pads single-digit days) and the bracketed
+    # timestamp, whose weekday name varies, are left out of the key.
+    templates = {}
+    for line in log_lines:
+        bracketed = _BRACKETED_RE.match(line)
+        message = line[bracketed.end():] if bracketed else line
+        key = _WHITESPACE_RE.sub(' ', _NUMBER_RE.sub('<N>', message)).strip()
+        entry = templates.get(key)
+        if entry is None:
+            templates[key] = [1, line]
         else:
-            dt = parse_traditional_syslog_datetime(line, year)
-        if dt and start <= dt < end:
-            filtered.append(line)
-    return '\n'.join(filtered)
+            entry[0] += 1
+    return [line if count == 1 else f"[x{count}] {line}" for count, line in templates.values()]
 
-def check_connection(ollama_url: str) -> bool:
+@st.cache_data(ttl=30)
+def get_tags(ollama_url: str) -> frozenset[str]:
+    # Failures raise instead of returning, because st.cache_data does not
+    # cache exceptions; a user who starts Ollama sees it on the next try.
+    response = get_session().get(f"{ollama_url}/api/tags", timeout=5)
+    response.raise_for_status()
     try:
-        response = requests.get(f"{ollama_url}/api/tags", timeout=5)
-        return response.status_code == 200
-    except requests.RequestException:
-        return False
+        models = orjson.loads(response.content).get('models', [])
+        return frozenset(m.get('name') for m in models)
+    except (orjson.JSONDecodeError, AttributeError, TypeError) as e:
+        raise ValueError(f"Unexpected /api/tags response: {e}") from e
 
-def ensure_model(ollama_url: str, model: str) -> bool:
+def analyze_logs(log_lines, ollama_url, model):
     try:
-        response = requests.get(f"{ollama_url}/api/tags")
-        if response.status_code == 200:
-            models = response.json().get('models', [])
-            for m in models:
-                if m.get('name') == model:
-                    return True
-        return False
-    except Exception:
-        return False
-
-def analyze_logs(log_content, ollama_url, model):
-    if not check_connection(ollama_url):
+        models = get_tags(ollama_url)
+        if model not in models:
+            # The model may have been pulled since the tags were cached.
+            get_tags.clear()
+            models = get_tags(ollama_url)
+    except requests.RequestException:
         return {"error": "Cannot connect to Ollama. Ensure it is running."}
-    if not ensure_model(ollama_url, model):
+    except ValueError as e:
+        return {"error": f"Ollama returned an invalid response: {str(e)}"}
+    if model not in models:
         return {"error": f"Model {model} not available."}
-    prompt = f"""
+    header = """
 You are an expert in troubleshooting and root cause analysis for IT systems and infrastructure.
 Analyze the following Linux syslog entries and provide a detailed RCA report.
-
-{log_content}
+An entry prefixed with [xN] stands for N entries that differ only in timestamps, numbers or spacing.
 """
+    # Join header and lines in one pass so the window is only copied into the prompt.
+    prompt = '\n'.join(chain((header,), collapse_repeated_lines(log_lines), ('',)))
     try:
-        response = requests.post(
+        response = get_session().post(
             f"{ollama_url}/api/generate",
-            json={"model": model, "prompt": prompt, "stream": False},
+            data=orjson.dumps({"model": model, "prompt": prompt, "stream": True}),
+            headers={"Content-Type": "application/json"},
+            stream=True,
             timeout=300
         )
         if response.status_code == 200:
-            result = response.json()
             return {
                 "success": True,
-                "analysis": result.get("response", "No response generated"),
-                "timestamp": datetime.now().isoformat()
+                "stream": stream_analysis(response)
             }
         else:
+            response.close()
             return {"error": f"API request failed with status {response.status_code}"}
     except requests.RequestException as e:
         return {"error": f"Request failed: {str(e)}"}
 
+class OllamaStreamError(Exception):
+    """Error reported by Ollama in the middle of a streamed response."""
+
+def stream_analysis(response):
+    # Ollama streams one JSON object per line; yield each text fragment as it arrives.
+    with response:
+        for chunk in response.iter_lines():
+            if not chunk:
+                continue
+            result = orjson.loads(chunk)
+            if "error" in result:
+                raise OllamaStreamError(result["error"])
+            yield result.get("response", "")
+            if result.get("done"):
+                break
+
 def main(): 
 #    st.title("LogWise")
 #    st.write("Accelerate incident resolution with AI-powered log analysis")
@@ -162,22 +267,31 @@ def main():
     uploaded_file = st.file_uploader("Upload a log file", type=["log", "txt"])
 
     if uploaded_file:
-        raw_content = uploaded_file.read().decode("utf-8", errors='ignore')
+        with uploaded_file.getbuffer() as buf:
+            file_hash = hashlib.blake2b(buf, digest_size=8).hexdigest()
+        # Only the current upload is kept, so earlier files' parsed lines are freed.
+        cached = st.session_state.get("parsed_upload")
+        if cached is None or cached[0] != file_hash:
+            timestamp_format = detect_timestamp_format(iter_log_lines(uploaded_file))
+            year = detect_log_year(iter_log_lines(uploaded_file), timestamp_format)
+            parsed_lines = parse_log_lines(iter_log_lines(uploaded_file), timestamp_format, year)
+            detected_year, detected_times = detect_year_and_times(parsed_lines, timestamp_format, year)
+            time_map = {dt.strftime('%Y-%m-%d %H:%M'): dt for dt in detected_times}
+            cached = (file_hash, timestamp_format, detected_year, time_map, parsed_lines)
+            st.session_state["parsed_upload"] = cached
+        _, timestamp_format, detected_year, time_map, parsed_lines = cached
 
-        timestamp_format = detect_timestamp_format(raw_content)
         st.markdown(f"**Detected timestamp format:** `{timestamp_format}`")
 
-        detected_year, detected_times = detect_year_and_times(raw_content, timestamp_format)
-        if not detected_times:
+        if not time_map:
             st.warning("No valid timestamped lines detected.")
             return
 
         st.markdown(f"**Detected year:** {detected_year}")
-        st.markdown("**Select exact event time:**")
+        st.markdown("**Select event time (minute):**")
 
-        time_options = [dt.strftime('%Y-%m-%d %H:%M:%S') for dt in detected_times]
-        selected_time_str = st.selectbox("Event Time:", time_options)
-        selected_datetime = datetime.strptime(selected_time_str, '%Y-%m-%d %H:%M:%S')
+        selected_time_str = st.selectbox("Event Time:", list(time_map))
+        selected_datetime = time_map[selected_time_str]
 
         duration_minutes = st.number_input("Duration (minutes):", min_value=1, max_value=1440, value=5)
 
@@ -185,20 +299,27 @@ def main():
 
         if st.button("Run AI RCA Analysis"):
             st.info("Filtering logs and running analysis...")
-            filtered_logs = filter_syslog_by_time(raw_content, selected_datetime, duration_minutes, detected_year, timestamp_format)
-            if not filtered_logs.strip():
+            filtered_logs = filter_syslog_by_time(parsed_lines, selected_datetime, duration_minutes)
+            if not filtered_logs:
                 st.warning("No logs found in the selected time window.")
             else:
                 result = analyze_logs(filtered_logs, ollama_url, model)
                 if "error" in result:
                     st.error(result["error"])
                 else:
-                    analysis_result = result['analysis']
-                    st.success(f"Analysis completed at {result['timestamp']}")
+                    try:
+                        analysis_result = st.write_stream(result["stream"])
+                    except (requests.RequestException, orjson.JSONDecodeError) as e:
+                        st.error(f"Request failed: {str(e)}")
+                    except OllamaStreamError as e:
+                        st.error(f"Analysis failed: {str(e)}")
+                    else:
+                        if analysis_result:
+                            st.success(f"Analysis completed at {datetime.now().isoformat()}")
+                        else:
+                            st.warning("No response generated")
 
         if analysis_result:
-            st.text_area("RCA Report", value=analysis_result, height=400)
-
             st.download_button(
                 label="Download RCA Report as Text File",
                 data=analysis_result,
@@ -19,7 +19,7 @@ echo 'url = "http://localhost:11434"' >> .streamlit/secrets.toml
 echo 'model = "llama3:8b"' >> .streamlit/secrets.toml
 # Install Python dependencies
 source bin/activate
-pip install streamlit requests
+pip install streamlit requests orjson
 wget https://raw.githubusercontent.com/vinil-v/FastEye/refs/heads/main/fasteye.py
 
 #build run script